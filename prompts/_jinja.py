@@ -0,0 +1,83 @@
+"""Jinja2 environment used to compile the templates.
+
+This module is imported lazily by `prompts.templates`, so that Jinja2 is only
+imported when a template actually needs it.
+
+"""
+
+import os
+from typing import Any, Dict, Optional, cast
+
+import jinja2
+from jinja2 import Environment, FileSystemBytecodeCache, StrictUndefined
+
+
+def _bytecode_cache() -> Optional[jinja2.BytecodeCache]:
+    """Persist the compiled templates in the directory `PROMPTS_JINJA_CACHE`.
+
+    This allows short-lived processes to skip the compilation of templates
+    that were compiled by a previous process. The cache is disabled when the
+    environment variable is not set.
+
+    """
+    directory = os.environ.get("PROMPTS_JINJA_CACHE")
+    if not directory:
+        return None
+
+    os.makedirs(directory, exist_ok=True)
+    return FileSystemBytecodeCache(directory)
+
+
+class JinjaTemplate(jinja2.Template):
+    """A Jinja2 template that can be rendered from a dictionary of values."""
+
+    def render_values(self, values: Dict[str, Any]) -> str:
+        """Render the template with a dictionary of values.
+
+        `Template.render` copies the values into a new dictionary, and then
+        copies this dictionary into the context along with the globals. Here
+        the values and globals are merged into the context in a single copy.
+
+        """
+        context = self.new_context({**self.globals, **values}, shared=True)
+        try:
+            return self.environment.concat(self.root_render_func(context))
+        except Exception:
+            self.environment.handle_exception()
+
+
+# A single environment is shared by all templates so that its configuration,
+# filters and internal caches are only set up once.
+ENV = Environment(
+    trim_blocks=True,
+    lstrip_blocks=True,
+    keep_trailing_newline=True,
+    undefined=StrictUndefined,
+    bytecode_cache=_bytecode_cache(),
+)
+ENV.template_class = JinjaTemplate
+
+
+def from_string(source: str) -> JinjaTemplate:
+    """Compile a template with the shared environment.
+
+    This is `Environment.from_string`, except that the compiled code is read
+    from and written to the environment's bytecode cache when there is one;
+    Jinja2 only uses this cache for templates that are loaded by name.
+
+    """
+    bytecode_cache = ENV.bytecode_cache
+    if bytecode_cache is None:
+        return cast(JinjaTemplate, ENV.from_string(source))
+
+    # The source is used as the template's name to derive the cache key
+    bucket = bytecode_cache.get_bucket(ENV, source, None, source)
+    code = bucket.code
+    if code is None:
+        code = bucket.code = ENV.compile(source)
+        bytecode_cache.set_bucket(bucket)
+
+    return cast(
+        JinjaTemplate,
+        ENV.template_class.from_code(ENV, code, ENV.make_globals(None)),
+    )
@@ -1,13 +1,63 @@
+import ast
 import inspect
+import keyword
 import re
+import sys
+import textwrap
+import types
+from collections import OrderedDict
 from dataclasses import dataclass, field
 from functools import lru_cache
-from typing import Callable, Dict, Hashable, Optional
-
-from jinja2 import Environment, StrictUndefined
-
-
-@dataclass
+from typing import (
+    IO,
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Hashable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+
+if TYPE_CHECKING:
+    from prompts._jinja import JinjaTemplate
+
+# Runs of whitespaces that follow a word character and do not start with a
+# linebreak, i.e. matches of `(?![\r\n])(\b\s+)`, excluding the single spaces
+# that would be replaced by themselves. Matching a whitespace character first
+# and checking the preceding word character with a lookbehind lets the regex
+# engine skip directly to the candidate positions.
+_WHITESPACE_RE = re.compile(r" (?<=\w.)\s+|[^\S \r\n](?<=\w.)\s*")
+
+# Whitespace characters, other than the space and linebreaks, that
+# `_WHITESPACE_RE` would replace with a single space.
+_OTHER_WHITESPACES = frozenset(
+    c for c in map(chr, range(0x3001)) if c.isspace() and c not in " \r\n"
+)
+_ASCII_OTHER_WHITESPACES = tuple(sorted(c for c in _OTHER_WHITESPACES if c.isascii()))
+
+# Placeholders that substitute a variable, e.g. `{{ name }}`.
+_PLACEHOLDER_RE = re.compile(r"\{\{\s*(\w+)\s*\}\}")
+
+# Names that Jinja2 parses as constants rather than variables.
+_JINJA_CONSTANTS = frozenset({"true", "false", "none", "True", "False", "None"})
+
+# Rendered templates, keyed on the template, model name and values.
+_RENDER_CACHE: "OrderedDict[Hashable, str]" = OrderedDict()
+_RENDER_CACHE_SIZE = 128
+
+# Characters stripped from the start of the lines by `inspect.cleandoc`, which
+# only strips spaces from Python 3.13; `None` strips all whitespaces.
+_CLEANDOC_WHITESPACES = " " if sys.version_info >= (3, 13) else None
+
+# Dataclasses only support `__slots__` from Python 3.10
+_DATACLASS_OPTIONS = {"slots": True} if sys.version_info >= (3, 10) else {}
+
+
+@dataclass(**_DATACLASS_OPTIONS)
 class Template:
     """Represents a prompt template.
 
@@ -57,6 +107,41 @@ class Template:
     signature: inspect.Signature
     model: Optional[str] = None
     registry: Dict[str, Callable] = field(default_factory=dict)
+    _bind: Callable[..., Dict[str, Any]] = field(init=False, repr=False, compare=False)
+    _compiled: Optional["_CompiledTemplate"] = field(
+        init=False, repr=False, compare=False
+    )
+    _render: Optional[Callable[..., str]] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        name = getattr(self.fn, "__name__", "")
+        self._bind = _binder(self.signature, name)
+
+        # Functions that return a string literal always return the same
+        # template, which can thus be compiled once and for all.
+        self._compiled = None
+        constant_template = _constant_template(self.fn)
+        if constant_template is not None:
+            try:
+                self._compiled = _compile(constant_template)
+            except Exception:
+                # Report errors, e.g. syntax errors, when the template is rendered
+                pass
+
+        # Substitution templates whose variables are all arguments of the
+        # function are rendered by a single generated function, which binds
+        # the arguments and returns the rendered f-string.
+        self._render = None
+        if isinstance(self._compiled, _SubstitutionTemplate):
+            self._compiled.specialize()
+            if self._compiled.names <= self.signature.parameters.keys():
+                f_string = self._compiled.f_string(lambda name: name)
+                self._render = _binder(self.signature, name, f_string)
+
+    def __reduce__(self):
+        # The generated functions cannot be pickled; they are rebuilt by
+        # `__post_init__` when the template is unpickled.
+        return (Template, (self.fn, self.signature, self.model, self.registry))
 
     def __call__(self, *args, **kwargs) -> str:
         """Render and return the template.
@@ -66,12 +151,38 @@ class Template:
         The rendered template as a Python ``str``.
 
         """
-        bound_arguments = self.signature.bind(*args, **kwargs)
-        bound_arguments.apply_defaults()
+        if self._render is not None:
+            return self._render(*args, **kwargs)
 
-        template = self.fn(**bound_arguments.arguments)
+        arguments = self._bind(*args, **kwargs)
+        compiled = self._compiled
+        if compiled is None:
+            compiled = _compile(self.fn(**arguments))
 
-        return render(template, self.model, **bound_arguments.arguments)
+        return compiled.render_values(arguments)
+
+    def render_to(self, writer: IO[str], *args, **kwargs) -> None:
+        """Render the template and write it to `writer` as it is generated.
+
+        This avoids building the whole rendered string in memory, which can
+        be useful for long prompts that are written to a file or a socket.
+
+        Parameters
+        ----------
+        writer
+            An object with a `write` method that accepts strings, e.g. a file
+            opened in text mode or an `io.StringIO` instance.
+        *args, **kwargs
+            The values of the prompt function's arguments.
+
+        """
+        arguments = self._bind(*args, **kwargs)
+        compiled = self._compiled
+        if compiled is None:
+            compiled = _compile(self.fn(**arguments))
+
+        for chunk in compiled.generate(arguments):
+            writer.write(chunk)
 
     def __getitem__(self, model_name: str):
         """Get the prompt template corresponding to a model name.
@@ -89,12 +200,13 @@ class Template:
         The template registered for the model name.
 
         """
-        try:
-            return self.registry[model_name]
-        except KeyError:
+        template = self.registry.get(model_name)
+        if template is None:
             self.model = model_name
             return self
 
+        return template
+
     def register(self, model_name: str):
         """Register the prompt template, as represented by a prompt function,
         for a given model `model_name`.
@@ -144,12 +256,11 @@ def template(fn: Callable) -> Template:
     A `Template` callable class which will render the template when called.
 
     """
-    signature = inspect.signature(fn)
+    signature = _signature(fn)
 
     return Template(fn, signature)
 
 
-@lru_cache
 def render(
     template: str,
     model_name: Optional[str] = None,
@@ -246,27 +357,451 @@ def render(
     -------
     A string that contains the rendered template.
 
+    """
+    try:
+        key = (template, model_name, frozenset(values.items()))
+    except TypeError:
+        # Values that are not hashable, e.g. lists, cannot be cached
+        return _compile(template).render_values(values)
+
+    try:
+        _RENDER_CACHE.move_to_end(key)
+        return _RENDER_CACHE[key]
+    except KeyError:
+        pass
+
+    result = _RENDER_CACHE[key] = _compile(template).render_values(values)
+    if len(_RENDER_CACHE) > _RENDER_CACHE_SIZE:
+        _RENDER_CACHE.popitem(last=False)
+
+    return result
+
+
+def _constant_template(fn: Callable) -> Optional[str]:
+    """Return the template of a function whose body returns a string literal.
+
+    Returns `None` when the function's source or code is not available, e.g.
+    for wrapped callables, or when the function does anything else than
+    returning a string literal.
+
+    """
+    try:
+        source = textwrap.dedent(inspect.getsource(fn))
+        module = ast.parse(source)
+    except (OSError, TypeError, SyntaxError):
+        return None
+
+    if len(module.body) != 1 or not isinstance(module.body[0], ast.FunctionDef):
+        return None
+
+    body = module.body[0].body
+    if (
+        len(body) == 2
+        and isinstance(body[0], ast.Expr)
+        and isinstance(body[0].value, ast.Constant)
+        and isinstance(body[0].value.value, str)
+    ):
+        # Ignore the docstring
+        body = body[1:]
+
+    if (
+        len(body) != 1
+        or not isinstance(body[0], ast.Return)
+        or not isinstance(body[0].value, ast.Constant)
+        or not isinstance(body[0].value.value, str)
+    ):
+        return None
+
+    # Make sure the source we parsed is the source of the function's code,
+    # which may not be the case if the file was modified after being imported.
+    template = body[0].value.value
+    code = getattr(fn, "__code__", None)
+    if code is None or template not in code.co_consts:
+        return None
+
+    return template
+
+
+def _binder(
+    signature: inspect.Signature, name: str, expression: Optional[str] = None
+) -> Callable[..., Any]:
+    """Generate a function that maps call arguments to parameter names.
+
+    The generated function has the same parameters as `signature` and returns
+    a dictionary of their values, so `binder(*args, **kwargs)` is equivalent
+    to `signature.bind(*args, **kwargs)` followed by `apply_defaults`. Python
+    binds the arguments natively, which is much faster than `Signature.bind`
+    and raises the same `TypeError` for invalid calls.
+
+    When `expression` is given, the function returns the value of this
+    expression, which can refer to the parameters, instead.
+
+    """
+    parameters = []
+    positional_defaults = []
+    keyword_defaults = {}
+    previous_kind = None
+    for parameter in signature.parameters.values():
+        kind = parameter.kind
+        if (
+            previous_kind == parameter.POSITIONAL_ONLY
+            and kind != parameter.POSITIONAL_ONLY
+        ):
+            parameters.append("/")
+        if kind == parameter.KEYWORD_ONLY and previous_kind in (
+            None,
+            parameter.POSITIONAL_ONLY,
+            parameter.POSITIONAL_OR_KEYWORD,
+        ):
+            parameters.append("*")
+
+        if kind == parameter.VAR_POSITIONAL:
+            parameters.append("*" + parameter.name)
+        elif kind == parameter.VAR_KEYWORD:
+            parameters.append("**" + parameter.name)
+        else:
+            parameters.append(parameter.name)
+            if parameter.default is not parameter.empty:
+                if kind == parameter.KEYWORD_ONLY:
+                    keyword_defaults[parameter.name] = parameter.default
+                else:
+                    positional_defaults.append(parameter.default)
+
+        previous_kind = kind
+
+    if previous_kind == inspect.Parameter.POSITIONAL_ONLY:
+        parameters.append("/")
+
+    if not name.isidentifier() or keyword.iskeyword(name):
+        name = "template"
+    if expression is None:
+        values = ", ".join(f"{p!r}: {p}" for p in signature.parameters)
+        expression = f"{{{values}}}"
+    source = f"def {name}({', '.join(parameters)}):\n    return {expression}"
+
+    namespace: Dict[str, Any] = {}
+    exec(source, namespace)
+    binder = namespace[name]
+    binder.__defaults__ = tuple(positional_defaults) or None
+    binder.__kwdefaults__ = keyword_defaults or None
+
+    return binder
+
+
+# Signatures of the functions decorated with `template`, see `_signature`.
+_SIGNATURES: "OrderedDict[Hashable, inspect.Signature]" = OrderedDict()
+_SIGNATURES_SIZE = 128
+
+
+def _signature(fn: Callable) -> inspect.Signature:
+    """Return the signature of a function, memoized on its code object.
+
+    Functions created from the same definition share their code object, but
+    can have different default values and annotations. These are thus part
+    of the key, by identity; the cached signature holds a reference to them
+    so their identifiers cannot be reused while the entry exists. Only the
+    most recently used signatures are kept, so that re-decorating functions,
+    e.g. in a notebook, does not keep their default values alive forever.
+
+    """
+    if (
+        not isinstance(fn, types.FunctionType)
+        or hasattr(fn, "__wrapped__")
+        or hasattr(fn, "__signature__")
+    ):
+        return inspect.signature(fn)
+
+    key = (
+        fn.__code__,
+        tuple(map(id, fn.__defaults__ or ())),
+        tuple((name, id(value)) for name, value in (fn.__kwdefaults__ or {}).items()),
+        tuple((name, id(value)) for name, value in fn.__annotations__.items()),
+    )
+    try:
+        _SIGNATURES.move_to_end(key)
+        return _SIGNATURES[key]
+    except KeyError:
+        pass
+
+    signature = _SIGNATURES[key] = inspect.signature(fn)
+    if len(_SIGNATURES) > _SIGNATURES_SIZE:
+        _SIGNATURES.popitem(last=False)
+
+    return signature
+
+
+class _SubstitutionTemplate:
+    """A template that only substitutes variables, rendered without Jinja2.
+
+    Most prompts only contain `{{ name }}` placeholders, with no control
+    structures, filters or expressions. For these, substituting the values
+    directly gives the same result as Jinja2 at a fraction of the cost.
+
+    The template is translated to a format string where each placeholder
+    becomes `{name!s}`; the `!s` conversion calls `str` on the value, like
+    Jinja2 does, rather than the value's `__format__` method. Templates that
+    are rendered often can be specialized into an f-string with `specialize`.
+
+    """
+
+    __slots__ = ("source", "names", "_render_function", "_jinja_template")
+
+    def __init__(self, source: str):
+        self.source = source
+
+        texts, names = self._split()
+        self.names = frozenset(names)
+
+        format_parts = [_escape_braces(texts[0])]
+        for name, text in zip(names, texts[1:]):
+            format_parts.append("{" + name + "!s}")
+            format_parts.append(_escape_braces(text))
+        self._render_function: Callable[[Dict[str, Any]], str] = "".join(
+            format_parts
+        ).format_map
+
+        self._jinja_template: Optional["JinjaTemplate"] = None
+
+    def _split(self) -> Tuple[List[str], List[str]]:
+        """Split the template into its texts and the placeholders' names."""
+        parts = _PLACEHOLDER_RE.split(self.source)
+        return parts[::2], parts[1::2]
+
+    def specialize(self) -> None:
+        """Render the template with a function generated for this template.
+
+        The function's body is a single f-string, the fastest way to build
+        a string in Python. Generating it is however slower than building
+        the format string, so we only do it for templates that are known to
+        be rendered many times.
+
+        """
+        f_string = self.f_string(lambda name: f"values[{name!r}]")
+
+        namespace: Dict[str, Any] = {}
+        exec(f"def render(values):\n    return {f_string}", namespace)
+        self._render_function = namespace["render"]
+
+    def f_string(self, value: Callable[[str], str]) -> str:
+        """Translate the template into the source code of an f-string.
+
+        Parameters
+        ----------
+        value
+            Function that returns the Python expression that evaluates to
+            the value of the variable whose name is passed.
+
+        """
+        texts, names = self._split()
+        parts = ["f" + repr(_escape_braces(texts[0]))]
+        for name, text in zip(names, texts[1:]):
+            parts.append(f'f"{{{value(name)}!s}}"')
+            parts.append("f" + repr(_escape_braces(text)))
+
+        return " ".join(parts)
+
+    def render(self, *args: Any, **kwargs: Any) -> str:
+        return self.render_values(dict(*args, **kwargs))
+
+    def render_values(self, values: Dict[str, Any]) -> str:
+        if not self.names <= values.keys():
+            # Let Jinja2 resolve the global variables, or raise an
+            # `UndefinedError` for the missing ones.
+            if self._jinja_template is None:
+                self._jinja_template = _from_string(self.source)
+            return self._jinja_template.render_values(values)
+
+        return self._render_function(values)
+
+    def generate(self, *args: Any, **kwargs: Any) -> Iterator[str]:
+        yield self.render(*args, **kwargs)
+
+
+def _escape_braces(text: str) -> str:
+    """Escape the braces of a text so it is left as is by `str.format`."""
+    return text.replace("{", "{{").replace("}", "}}")
+
+
+class _StaticTemplate:
+    """A template without any placeholder or tag, rendered as is."""
+
+    __slots__ = ("source",)
+
+    def __init__(self, source: str):
+        self.source = source
+
+    def render(self, *args: Any, **kwargs: Any) -> str:
+        return self.source
+
+    def render_values(self, values: Dict[str, Any]) -> str:
+        return self.source
+
+    def generate(self, *args: Any, **kwargs: Any) -> Iterator[str]:
+        yield self.source
+
+
+_CompiledTemplate = Union["JinjaTemplate", _SubstitutionTemplate, _StaticTemplate]
+
+
+@lru_cache(maxsize=512)
+def _compile(template: str) -> _CompiledTemplate:
+    """Clean and compile a template string.
+
+    Compiled templates are cached so that the Jinja2 lexer, parser and code
+    generator only run once per distinct template string. Templates that only
+    substitute variables, or contain no placeholder at all, bypass Jinja2
+    altogether.
+
+    """
+    cleaned_template = _clean(template)
+    if _is_substitution_only(cleaned_template):
+        if "{{" not in cleaned_template:
+            return _StaticTemplate(cleaned_template)
+        return _SubstitutionTemplate(cleaned_template)
+
+    return _from_string(cleaned_template)
+
+
+def _from_string(source: str) -> "JinjaTemplate":
+    """Compile a template with Jinja2.
+
+    Jinja2 is imported the first time a template needs it, since templates
+    that only substitute variables are rendered without it.
+
+    """
+    from prompts._jinja import from_string
+
+    return from_string(source)
+
+
+def _is_substitution_only(template: str) -> bool:
+    """Check whether the template only contains `{{ name }}` placeholders.
+
+    The text between placeholders must not contain anything Jinja2 would
+    interpret, and the names must be parsed as variables by Jinja2.
+
+    """
+    # Jinja2 normalizes linebreaks in the template's text
+    if "\r" in template:
+        return False
+
+    parts = _PLACEHOLDER_RE.split(template)
+    texts, names = parts[::2], parts[1::2]
+    for text in texts:
+        if "{{" in text or "{%" in text or "{#" in text:
+            return False
+    # A brace before a placeholder, e.g. `{{{ name }}`, changes how it is lexed
+    for text in texts[:-1]:
+        if text.endswith("{"):
+            return False
+    for name in names:
+        if (
+            not name.isidentifier()
+            or keyword.iskeyword(name)
+            or name in _JINJA_CONSTANTS
+        ):
+            return False
+
+    return True
+
+
+def _clean(template: str) -> str:
+    """Dedent the template and normalize its whitespaces.
+
+    See `render` for a description of the formatting conventions.
+
     """
     # Dedent, and remove extra linebreak
-    cleaned_template = inspect.cleandoc(template)
+    cleaned_template = _cleandoc(template)
 
     # Add linebreak if there were any extra linebreaks that
     # `cleandoc` would have removed
-    ends_with_linebreak = template.replace(" ", "").endswith("\n\n")
-    if ends_with_linebreak:
+    if _ends_with_double_linebreak(template):
         cleaned_template += "\n"
 
     # Remove extra whitespaces, except those that immediately follow a newline symbol.
     # This is necessary to avoid introducing whitespaces after backslash `\` characters
     # used to continue to the next line without linebreak.
-    cleaned_template = re.sub(r"(?![\r\n])(\b\s+)", " ", cleaned_template)
+    # Most templates only contain single spaces, in which case there is nothing
+    # to replace and we can skip the regular expression altogether.
+    if (
+        "  " in cleaned_template
+        or " \n" in cleaned_template
+        or " \r" in cleaned_template
+        or _has_other_whitespaces(cleaned_template)
+    ):
+        cleaned_template = _WHITESPACE_RE.sub(" ", cleaned_template)
 
-    env = Environment(
-        trim_blocks=True,
-        lstrip_blocks=True,
-        keep_trailing_newline=True,
-        undefined=StrictUndefined,
-    )
-    jinja_template = env.from_string(cleaned_template)
+    return cleaned_template
 
-    return jinja_template.render(**values)
+
+def _cleandoc(template: str) -> str:
+    """Dedent the template, with the same result as `inspect.cleandoc`.
+
+    This follows the behavior of the running Python version: from Python
+    3.13, only spaces are considered indentation, not other whitespaces.
+    Single-line templates are returned early, and the lines are only copied
+    when they need to be dedented or when blank lines need to be removed.
+
+    """
+    if "\t" in template:
+        template = template.expandtabs()
+    if "\n" not in template:
+        return template.lstrip(_CLEANDOC_WHITESPACES)
+
+    lines = template.split("\n")
+    lines[0] = lines[0].lstrip(_CLEANDOC_WHITESPACES)
+
+    # Minimum indentation of the non-blank lines after the first line
+    margin: Optional[int] = None
+    for line in lines[1:]:
+        content = len(line.lstrip(_CLEANDOC_WHITESPACES))
+        if content:
+            indent = len(line) - content
+            if margin is None or indent < margin:
+                margin = indent
+    if margin:
+        lines[1:] = [line[margin:] for line in lines[1:]]
+
+    # Remove the leading and trailing blank lines
+    start, end = 0, len(lines)
+    while start < end and not lines[start]:
+        start += 1
+    while end > start and not lines[end - 1]:
+        end -= 1
+
+    return "\n".join(lines[start:end])
+
+
+def _has_other_whitespaces(template: str) -> bool:
+    """Check whether the template contains any of `_OTHER_WHITESPACES`.
+
+    Most templates are ASCII strings, which can only contain a handful of
+    these characters; looking for each of them with `in` is much faster
+    than iterating over the template's characters.
+
+    """
+    if template.isascii():
+        return any(char in template for char in _ASCII_OTHER_WHITESPACES)
+
+    return not _OTHER_WHITESPACES.isdisjoint(template)
+
+
+def _ends_with_double_linebreak(template: str) -> bool:
+    """Check whether the template ends with two linebreaks, ignoring spaces.
+
+    This is equivalent to `template.replace(" ", "").endswith("\\n\\n")`, but
+    only scans the trailing whitespaces instead of copying the whole string.
+
+    """
+    linebreaks = 0
+    for i in range(len(template) - 1, -1, -1):
+        char = template[i]
+        if char == "\n":
+            linebreaks += 1
+            if linebreaks == 2:
+                return True
+        elif char != " ":
+            return False
+
+    return False
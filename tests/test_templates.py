@@ -1,45 +1,85 @@
+import enum
+import functools
+import io
+import pickle
 import random
 import string
+import subprocess
+import sys
 
 import pytest
+from jinja2 import FileSystemBytecodeCache, TemplateSyntaxError, UndefinedError
 
 import prompts
-from prompts.templates import render
-
-
-def test_render():
-    tpl = """
-    A test string"""
-    assert render(tpl) == "A test string"
-
-    tpl = """
+from prompts._jinja import ENV
+from prompts.templates import (
+    _RENDER_CACHE,
+    _compile,
+    _StaticTemplate,
+    _SubstitutionTemplate,
+    render,
+)
+
+_ALPHABET = string.ascii_uppercase + string.digits
+
+
+@pytest.mark.parametrize(
+    "tpl,expected",
+    [
+        (
+            """
+    A test string""",
+            "A test string",
+        ),
+        (
+            """
     A test string
-    """
-    assert render(tpl) == "A test string"
-
-    tpl = """
+    """,
+            "A test string",
+        ),
+        (
+            """
         A test
         Another test
-    """
-    assert render(tpl) == "A test\nAnother test"
-
-    tpl = """A test
+    """,
+            "A test\nAnother test",
+        ),
+        (
+            """A test
         Another test
-    """
-    assert render(tpl) == "A test\nAnother test"
-
-    tpl = """
+    """,
+            "A test\nAnother test",
+        ),
+        (
+            """
         A test line
             An indented line
-    """
-    assert render(tpl) == "A test line\n    An indented line"
-
-    tpl = """
+    """,
+            "A test line\n    An indented line",
+        ),
+        (
+            """
         A test line
             An indented line
 
-    """
-    assert render(tpl) == "A test line\n    An indented line\n"
+    """,
+            "A test line\n    An indented line\n",
+        ),
+        (
+            """
+        A\ttest  with \u00a0 extra whitespaces \n
+        Another test
+    """,
+            "A test with extra whitespaces Another test",
+        ),
+    ],
+)
+def test_render(tpl, expected):
+    assert render(tpl) == expected
+
+    # Rendering the same template again reuses the cleaned, compiled template
+    assert render(tpl) == expected
+    assert _compile(tpl) is _compile(tpl)
 
 
 def test_render_escaped_linebreak():
@@ -129,12 +169,104 @@ def test_render_jinja():
     assert prompt == "  one\n  two\n"
 
 
+def test_render_cache():
+    tpl = "{{ a }} and {{ b }}"
+    assert render(tpl, a=1, b=2) == "1 and 2"
+    assert render(tpl, b=2, a=1) == "1 and 2"
+    assert len([key for key in _RENDER_CACHE if key[0] == tpl]) == 1
+
+    # Unhashable values are rendered but not cached
+    assert render(tpl, a=[1], b=2) == "[1] and 2"
+    assert len([key for key in _RENDER_CACHE if key[0] == tpl]) == 1
+
+
+def test_render_substitution_only():
+    tpl = "{{ a }} and {{b}}"
+    assert isinstance(_compile(tpl), _SubstitutionTemplate)
+    assert render(tpl, a=1, b=None) == "1 and None"
+    assert render("{ {{a}} }", a=1) == "{ 1 }"
+
+    # Values are converted with `str`, like Jinja2 does
+    class Color(enum.IntEnum):
+        RED = 1
+
+    assert render(tpl, a=Color.RED, b=2) == f"{str(Color.RED)} and 2"
+
+    with pytest.raises(UndefinedError):
+        render(tpl, a=1)
+
+    assert isinstance(_compile("{{ range }}"), _SubstitutionTemplate)
+    assert render("{{ range }}") == str(range)
+
+    specialized = _SubstitutionTemplate("'{ {{a}} }'\n\\ \"{{ b }}\"")
+    specialized.specialize()
+    assert specialized.render(a=1, b=Color.RED) == f"'{{ 1 }}'\n\\ \"{Color.RED!s}\""
+
+    for tpl in [
+        "{{ a|upper }}",
+        "{{ a.b }}",
+        "{{ a }}{# a #}",
+        "{{ true }}",
+        "{{- a }}",
+    ]:
+        assert not isinstance(_compile(tpl), _SubstitutionTemplate)
+
+
+def test_render_static():
+    tpl = """
+        A static {template}
+    """
+    assert isinstance(_compile(tpl), _StaticTemplate)
+    assert render(tpl) == "A static {template}"
+    assert render(tpl, unused=1) == "A static {template}"
+
+    assert not isinstance(_compile("Windows\r\nlinebreak"), _StaticTemplate)
+    assert render("Windows\r\nlinebreak") == "Windows\nlinebreak"
+
+
+def test_render_bytecode_cache(monkeypatch, tmp_path):
+    monkeypatch.setattr(ENV, "bytecode_cache", FileSystemBytecodeCache(tmp_path))
+    _compile.cache_clear()
+
+    tpl = "{% for e in examples %}{{e}} {% endfor %}"
+    assert render(tpl, examples=("one", "two")) == "one two "
+    assert len(list(tmp_path.iterdir())) == 1
+
+    _compile.cache_clear()
+    assert render(tpl, examples=("three",)) == "three "
+    assert len(list(tmp_path.iterdir())) == 1
+
+
+def test_import_without_jinja():
+    code = "import sys, prompts; assert 'jinja2' not in sys.modules"
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+
+def module_tpl(variable):
+    return """{{variable}} test"""
+
+
+def module_tpl_name(variable):
+    return """name: {{variable}}"""
+
+
+def test_prompt_pickle():
+    tpl = prompts.template(module_tpl)
+    tpl.register("provider/name")(module_tpl_name)
+
+    unpickled = pickle.loads(pickle.dumps(tpl))
+    assert unpickled == tpl
+    assert unpickled("test") == "test test"
+    assert unpickled["provider/name"]("test") == "name: test"
+
+
 def test_prompt_basic():
     @prompts.template
     def test_tpl(variable):
         return """{{variable}} test"""
 
     assert list(test_tpl.signature.parameters.keys()) == ["variable"]
+    assert prompts.template(test_tpl.fn) == test_tpl
 
     with pytest.raises(TypeError):
         test_tpl(v="test")
@@ -152,6 +284,13 @@ def test_prompt_basic():
     p = test_tpl("test")
     assert p == "test test"
 
+    @prompts.template
+    def test_globals_tpl(n):
+        return """{% for i in range(n) %}{{i}}{% endfor %}"""
+
+    p = test_globals_tpl(3)
+    assert p == "012"
+
 
 def test_prompt_kwargs():
     @prompts.template
@@ -169,6 +308,131 @@ def test_prompt_kwargs():
     p = test_kwarg_tpl("test", "test")
     assert p == "test and test"
 
+    p = test_kwarg_tpl(var="test")
+    assert p == "test and other"
+
+    p = test_kwarg_tpl(other_var="kwarg", var="test")
+    assert p == "test and kwarg"
+
+    with pytest.raises(TypeError):
+        test_kwarg_tpl(other_var="kwarg")
+
+    with pytest.raises(TypeError, match="test_kwarg_tpl"):
+        test_kwarg_tpl(var="test", v="test")
+
+    with pytest.raises(TypeError):
+        test_kwarg_tpl("test", "test", "test")
+
+    with pytest.raises(TypeError):
+        test_kwarg_tpl("test", var="test")
+
+
+def test_prompt_compile_cache():
+    @prompts.template
+    def test_tpl(examples):
+        return """{% for e in examples %}{{e}} {% endfor %}"""
+
+    # Templates returned as string literals are compiled when decorated
+    assert test_tpl._compiled is not None
+
+    # Unhashable values can be passed to the template
+    assert test_tpl(["one", "two"]) == "one two "
+
+    # Substitution templates are rendered by a generated function
+    @prompts.template
+    def test_substitution_tpl(a, b="b"):
+        return """{{ a }} and {{ b }}"""
+
+    assert test_substitution_tpl._render is not None
+    assert test_substitution_tpl("a") == "a and b"
+    assert test_substitution_tpl(b=1, a=[0]) == "[0] and 1"
+
+    @prompts.template
+    def test_globals_tpl(a):
+        return """{{ a }} and {{ range }}"""
+
+    assert test_globals_tpl._render is None
+    assert test_globals_tpl("a") == f"a and {range}"
+
+    @prompts.template
+    def test_dynamic_tpl(examples, sep):
+        return "{% for e in examples %}{{e}}" + sep + "{% endfor %}"
+
+    assert test_dynamic_tpl._compiled is None
+
+    _compile.cache_clear()
+    assert test_dynamic_tpl(["one", "two"], " ") == "one two "
+    assert test_dynamic_tpl(["three"], " ") == "three "
+    assert test_dynamic_tpl(["three"], ", ") == "three, "
+
+    info = _compile.cache_info()
+    assert info.misses == 2
+    assert info.hits == 1
+
+    # Syntax errors are raised when rendering the template
+    @prompts.template
+    def test_invalid_tpl():
+        return """{% for %}"""
+
+    with pytest.raises(TemplateSyntaxError):
+        test_invalid_tpl()
+
+
+def test_prompt_wrapped():
+    def tpl(variable):
+        return """{{variable}} test"""
+
+    class Wrapper:
+        def __init__(self, fn):
+            functools.update_wrapper(self, fn)
+
+        def __call__(self, *args, **kwargs):
+            return self.__wrapped__(*args, **kwargs)
+
+    assert prompts.template(functools.lru_cache(tpl))("test") == "test test"
+    assert prompts.template(Wrapper(tpl))("test") == "test test"
+
+
+def test_prompt_signature_cache():
+    def make_tpl(default):
+        @prompts.template
+        def test_tpl(var=default):
+            return """{{var}}"""
+
+        return test_tpl
+
+    tpl_a = make_tpl("a")
+    tpl_b = make_tpl("b")
+    assert tpl_a() == "a"
+    assert tpl_b() == "b"
+    assert tpl_a.signature is not tpl_b.signature
+
+    assert make_tpl(tpl_a.signature.parameters["var"].default).signature is (
+        tpl_a.signature
+    )
+
+
+def test_prompt_render_to():
+    @prompts.template
+    def test_tpl(examples, final="final"):
+        return """
+        {% for e in examples %}
+        Example: {{e}}
+        {% endfor %}
+        {{ final }}"""
+
+    writer = io.StringIO()
+    test_tpl.render_to(writer, ["one", "two"])
+    assert writer.getvalue() == test_tpl(["one", "two"])
+
+    @prompts.template
+    def test_simple_tpl(variable):
+        return """{{variable}} test"""
+
+    writer = io.StringIO()
+    test_simple_tpl.render_to(writer, variable="test")
+    assert writer.getvalue() == "test test"
+
 
 @pytest.mark.filterwarnings("ignore: The model")
 def test_dispatch():
@@ -206,13 +470,8 @@ def test_benchmark_template_render(benchmark):
 
     def setup():
         """We generate random strings to make sure we don't hit any potential cache."""
-        length = 10
-        var0 = "".join(
-            random.choice(string.ascii_uppercase + string.digits) for _ in range(length)
-        )
-        var1 = "".join(
-            random.choice(string.ascii_uppercase + string.digits) for _ in range(length)
-        )
+        var0 = "".join(random.choices(_ALPHABET, k=10))
+        var1 = "".join(random.choices(_ALPHABET, k=10))
         return (var0, var1), {}
 
     benchmark.pedantic(test_tpl, setup=setup, rounds=500)
@@ -224,13 +483,8 @@ def test_benchmark_template_function(benchmark):
         return var0 + f"{var1} test"
 
     def setup():
-        length = 10
-        var0 = "".join(
-            random.choice(string.ascii_uppercase + string.digits) for _ in range(length)
-        )
-        var1 = "".join(
-            random.choice(string.ascii_uppercase + string.digits) for _ in range(length)
-        )
+        var0 = "".join(random.choices(_ALPHABET, k=10))
+        var1 = "".join(random.choices(_ALPHABET, k=10))
         return (var0, var1), {}
 
     benchmark.pedantic(test_tpl, setup=setup, rounds=500)